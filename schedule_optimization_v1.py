@@ -1,7 +1,34 @@
+import numpy as np
 import streamlit as st
 import plotly.graph_objects as go
 
+from scheduling_core import build_schedule, format_tasks, get_build_schedule, row_labels
+
+
+@st.cache_resource
+def _compiled_core():
+    # Pin the (possibly numba-compiled) scheduling core across Streamlit reruns
+    # so widget changes never re-trigger JIT compilation
+    return get_build_schedule()
+
+
+@st.cache_data
+def _cached_schedule(step_order, steps_items, tank_items, num_cycles):
+    # Keyed on hashable tuple versions of the inputs, so reruns with unchanged
+    # settings skip the scheduling work entirely. Rebuild the dict form the
+    # core expects from the tuples.
+    steps = {s: {'setup': su, 'operation': op, 'cleaning': cl, 'tanks': list(tanks)}
+             for s, su, op, cl, tanks in steps_items}
+    return build_schedule(list(step_order), steps, dict(tank_items), num_cycles)
+
+
 def run_simulation(step_order, steps, tank_cleaning_time, bioreactor_days, num_of_bioreactors):
+    # Validate before any scheduling or figure work - degenerate inputs would
+    # otherwise divide by zero or build an empty chart
+    if bioreactor_days <= 0 or num_of_bioreactors <= 0:
+        st.warning("Bioreactor days and number of bioreactors must both be positive")
+        return
+
     step_durations = {step: values['setup'] + values['operation'] + values['cleaning'] for step, values in steps.items()}
     min_step_duration = min(step_durations.values())
 
@@ -13,122 +40,73 @@ def run_simulation(step_order, steps, tank_cleaning_time, bioreactor_days, num_o
     num_cycles = int(cadence * 24 / min_step_duration)
     st.write(f"Max cycles for every step: {num_cycles}")
 
-    schedule = []
-    last_clean_end = {s: 0.0 for s in step_order}
-
-    for cycle in range(1, num_cycles + 1):
-        pipeline_times = {}
-        prev_op_end = 0
-        for i, step in enumerate(step_order):
-            info = steps[step]
-            setup_start = prev_op_end - info['setup']
-            setup_end = setup_start + info['setup']
-            op_start = setup_end
-            op_end = op_start + info['operation']
-            clean_start = op_end
-            clean_end = clean_start + info['cleaning']
-            pipeline_times[step] = {
-                'setup_start': setup_start,
-                'setup_end': setup_end,
-                'op_start': op_start,
-                'op_end': op_end,
-                'clean_start': clean_start,
-                'clean_end': clean_end
-            }
-            prev_op_end = op_end
-
-        shift = 0
-        for step in step_order:
-            required_shift = max(0, last_clean_end[step] - pipeline_times[step]['setup_start'])
-            if required_shift > shift:
-                shift = required_shift
-
-        for step in step_order:
-            info = steps[step]
-            times = pipeline_times[step]
-            setup_start = times['setup_start'] + shift
-            setup_end = times['setup_end'] + shift
-            op_start = times['op_start'] + shift
-            op_end = times['op_end'] + shift
-            clean_start = times['clean_start'] + shift
-            clean_end = times['clean_end'] + shift
-
-            schedule.append({'task': f'{step} Setup (Cycle {cycle})', 'start': setup_start, 'end': setup_end, 'row': step})
-            schedule.append({'task': f'{step} Operation (Cycle {cycle})', 'start': op_start, 'end': op_end, 'row': step})
-            schedule.append({'task': f'{step} Cleaning (Cycle {cycle})', 'start': clean_start, 'end': clean_end, 'row': step})
-
-            for tank in info['tanks']:
-                t_start = setup_start
-                t_end = t_start + tank_cleaning_time[tank]
-                schedule.append({'task': f'{tank} Cleaning (Cycle {cycle})', 'start': t_start, 'end': t_end, 'row': tank})
-
-            last_clean_end[step] = clean_end
+    if num_cycles <= 0:
+        st.warning("No cycles fit in the cadence - shorten the steps or increase the bioreactor days")
+        return
+
+    # Build the full schedule with the shared numeric core (JIT-compiled when
+    # numba is installed); the result is cached on the immutable input tuples
+    _compiled_core()
+    steps_items = tuple((s, info['setup'], info['operation'], info['cleaning'], tuple(info['tanks']))
+                        for s, info in steps.items())
+    tank_items = tuple(sorted(tank_cleaning_time.items()))
+    schedule = _cached_schedule(tuple(step_order), steps_items, tank_items, num_cycles)
 
     # --- Build deterministic row order & mapping ---
- 
-    # Sort rows: steps first, then tanks
-    rows = sorted(set(item['row'] for item in schedule), key=lambda r: (r not in step_order, r))
-    
-    # --- Create Plotly figure ---
-    fig = go.Figure()
-
-    # Create a set to keep track of which task types have been added to the legend
-    added_to_legend = set()
-
-    for item in schedule:
-        # Determine task type for color
-        if 'Tank' in item['task']:
-            color = 'gray'
-            task_name = 'Tank'
-        else:
-            color_type = item['task'].split()[1]
-            if color_type == "Setup":
-                color = 'lightblue'
-                task_name = 'Setup'
-            elif color_type == "Operation":
-                color = 'lightgreen'
-                task_name = 'Operation'
-            else:  # Cleaning
-                color = 'salmon'
-                task_name = 'Cleaning'
-
-        # Determine if this is the first time we've seen this task type
-        show_legend = task_name not in added_to_legend
-        if show_legend:
-            added_to_legend.add(task_name)
-
-        fig.add_trace(go.Bar(
-            y=[item['row']],
-            x=[item['end'] - item['start']],
-            base=[item['start']],
-            orientation='h',
-            # text=[item['task']],
-            # textposition="outside",
-            marker=dict(color=color),
-            name=task_name,  # <--- Use a consistent name
-            showlegend=show_legend, # <--- Only show the legend for the first occurrence
-            hovertext=[f"{item['task']}<br>Start: {item['start']}<br>End: {item['end']}"],
-            width=0.8
-        ))
+
+    # Rows: steps first, then tanks - known directly from the inputs, no need to scan the schedule
+    rows = row_labels(step_order, steps)
     
-        # # --- Add the text as a separate annotation ---
-        # fig.add_annotation(
-        #     x=item['end'],  # Set the x position to the end of the bar
-        #     y=item['row'],  # Set the y position to the center of the bar
-        #     text=item['task'],  # The text to display
-        #     showarrow=False,  # Hide the arrow
-        #     xshift=0,  # Shift the text slightly to the right
-        #     yshift=50,  # Shift the text slightly down
-        #     font=dict(color='white', size=12),
-        # )
-
-    # --- Layout ---
-    fig.update_layout(
-        title="Pipeline Schedule",
-        xaxis_title="Time (hours)",
-        yaxis_title="Steps",
-        height=max(400, 30*len(rows))
-    )
+    # One trace per task type instead of one per bar: the structured schedule array
+    # is sliced per ttype code into vectorized y/x/base/hover arrays, keeping the
+    # figure payload small with one legend entry per type for free
+    trace_styles = [('Setup', 'lightblue'), ('Operation', 'lightgreen'), ('Cleaning', 'salmon'), ('Tank', 'gray')]
+    rows_arr = np.array(rows)
+
+    def trace_arrays(ttype):
+        m = schedule['ttype'] == ttype
+        starts = schedule['start'][m]
+        ends = schedule['end'][m]
+        # Hover labels are only needed for the bars in this trace, so format them here
+        hover_tasks = format_tasks(step_order, steps, schedule, np.flatnonzero(m))
+        hover = [f"{t}<br>Start: {s}<br>End: {e}" for t, s, e in zip(hover_tasks, starts, ends)]
+        return rows_arr[schedule['row'][m]], ends - starts, starts, hover
+
+    # --- Create (or reuse) the Plotly figure ---
+    # When the task topology (rows and per-cycle bar layout) is unchanged between
+    # reruns, only the numeric arrays differ, so swap them into the existing
+    # traces instead of rebuilding and re-validating the whole figure
+    signature = (tuple(rows), schedule['row'].tobytes(), schedule['ttype'].tobytes())
+    fig = st.session_state.get('schedule_fig')
+
+    if fig is not None and st.session_state.get('schedule_fig_signature') == signature:
+        for ttype, trace in enumerate(fig.data):
+            _, x, base, hover = trace_arrays(ttype)
+            trace.x = x
+            trace.base = base
+            trace.hovertext = hover
+    else:
+        fig = go.Figure()
+        for ttype, (task_name, color) in enumerate(trace_styles):
+            y, x, base, hover = trace_arrays(ttype)
+            fig.add_trace(go.Bar(
+                y=y,
+                x=x,
+                base=base,
+                orientation='h',
+                marker=dict(color=color),
+                name=task_name,
+                hovertext=hover,
+                width=0.8
+            ))
+        fig.update_layout(
+            title="Pipeline Schedule",
+            xaxis_title="Time (hours)",
+            yaxis_title="Steps",
+            height=max(400, 30*len(rows))
+        )
+        st.session_state['schedule_fig'] = fig
+        st.session_state['schedule_fig_signature'] = signature
 
     # --- Display in Streamlit ---
     st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,151 @@
+# Shared scheduling core used by schedule_optimization.py and schedule_optimization_v1.py.
+# The cycle loop is kept purely numeric (no dicts or strings) so it can be JIT-compiled
+# with numba when available; without numba the same function runs as plain Python/NumPy.
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # numba is optional - fall back to the interpreted loop
+    HAVE_NUMBA = False
+
+# Task-type codes stored on every schedule entry; renderers index their color
+# tables with these instead of re-parsing the task string per item
+TTYPE_SETUP, TTYPE_OPERATION, TTYPE_CLEANING, TTYPE_TANK = range(4)
+
+# Column layout of the schedule array returned by build_schedule; 'row' indexes
+# into row_labels(), 'ttype' is one of the TTYPE_* codes above
+SCHEDULE_DTYPE = np.dtype([('start', 'f4'), ('end', 'f4'), ('row', 'u2'), ('ttype', 'u1')])
+
+
+def _build_schedule_impl(setup_start, clean_end, start_pattern, end_pattern, num_cycles):
+    """Apply the per-cycle resource shift to the precomputed task pattern.
+
+    setup_start/clean_end are the zero-shift per-step times; start_pattern and
+    end_pattern hold the zero-shift times of every task in one cycle. Returns
+    flat (starts, ends) arrays covering all cycles; only the shift recurrence
+    is sequential, everything else is a shifted copy of the pattern.
+    """
+    num_steps = setup_start.shape[0]
+    tasks_per_cycle = start_pattern.shape[0]
+
+    starts = np.empty(num_cycles * tasks_per_cycle)
+    ends = np.empty(num_cycles * tasks_per_cycle)
+
+    last_clean_end = np.zeros(num_steps)
+    for cycle in range(num_cycles):
+        # Shift the whole cycle so no step starts before its previous cleaning
+        # ended: a single branchless subtract-and-max reduction, clipped at zero
+        shift = max(0.0, (last_clean_end - setup_start).max())
+
+        lo = cycle * tasks_per_cycle
+        hi = lo + tasks_per_cycle
+        starts[lo:hi] = start_pattern + shift
+        ends[lo:hi] = end_pattern + shift
+        last_clean_end[:] = clean_end + shift
+
+    return starts, ends
+
+
+_build_schedule = None
+
+
+def get_build_schedule():
+    """Return the numeric core, JIT-wrapping it on first use when numba is available.
+
+    Deferring the njit wrap keeps it out of import time and gives callers (e.g. the
+    Streamlit app) a single function object they can pin across reruns.
+    """
+    global _build_schedule
+    if _build_schedule is None:
+        if HAVE_NUMBA:
+            _build_schedule = njit(cache=True)(_build_schedule_impl)
+        else:
+            _build_schedule = _build_schedule_impl
+    return _build_schedule
+
+
+def row_labels(step_order, steps):
+    """Row universe for the Gantt charts: steps in pipeline order, then tanks sorted by name."""
+    return list(step_order) + sorted({t for s in steps.values() for t in s['tanks']})
+
+
+# ttype code -> verb in the display label (tank entries are cleanings too)
+_KINDS = ('Setup', 'Operation', 'Cleaning', 'Cleaning')
+
+
+def format_tasks(step_order, steps, sched, indices):
+    """Format display labels for the given schedule indices.
+
+    Labels are derived on demand from the row/ttype columns and the entry's
+    position (the cycle number), so scheduling never pays for strings that are
+    only needed on hover or for small annotated charts.
+    """
+    labels = row_labels(step_order, steps)
+    per_cycle = 3 * len(step_order) + sum(len(s['tanks']) for s in steps.values())
+    return [f"{labels[sched['row'][p]]} {_KINDS[sched['ttype'][p]]} (Cycle {p // per_cycle + 1})"
+            for p in indices]
+
+
+def build_schedule(step_order, steps, tank_cleaning_time, num_cycles):
+    """Run the numeric core and return the schedule as a structured array.
+
+    The array uses SCHEDULE_DTYPE, so renderers can slice whole columns
+    (e.g. sched['start'][sched['ttype'] == TTYPE_SETUP]) instead of iterating
+    per-task dicts. Display labels are formatted on demand via format_tasks.
+    """
+    num_steps = len(step_order)
+    tank_labels = sorted({t for s in steps.values() for t in s['tanks']})
+    tank_index = {t: i for i, t in enumerate(tank_labels)}
+
+    setup = np.array([steps[s]['setup'] for s in step_order], dtype=np.float64)
+    op = np.array([steps[s]['operation'] for s in step_order], dtype=np.float64)
+    clean = np.array([steps[s]['cleaning'] for s in step_order], dtype=np.float64)
+
+    # Ideal pipeline times assuming unlimited resources: each op starts where the previous op ends
+    op_end = np.cumsum(op)
+    op_start = op_end - op
+    setup_start = op_start - setup
+    clean_end = op_end + clean
+
+    # Precompute each step's tank group once (cleaning durations and row ids)
+    tank_ct_per_step = [np.array([tank_cleaning_time[t] for t in steps[s]['tanks']], dtype=np.float64)
+                        for s in step_order]
+    tank_rows_per_step = [np.array([tank_index[t] for t in steps[s]['tanks']], dtype=np.uint16)
+                          for s in step_order]
+
+    # Zero-shift pattern of one full cycle: per step its Setup/Operation/Cleaning
+    # tasks followed by its tank cleanings, written with slice assignment so the
+    # tank groups need no Python-level inner loop
+    tasks_per_step = 3 + np.array([len(steps[s]['tanks']) for s in step_order])
+    tasks_per_cycle = int(tasks_per_step.sum())
+    start_pattern = np.empty(tasks_per_cycle)
+    end_pattern = np.empty(tasks_per_cycle)
+    row_pattern = np.empty(tasks_per_cycle, dtype=np.uint16)
+    ttype_pattern = np.empty(tasks_per_cycle, dtype=np.uint8)
+
+    k = 0
+    for i in range(num_steps):
+        start_pattern[k:k + 3] = (setup_start[i], op_start[i], op_end[i])
+        end_pattern[k:k + 3] = (op_start[i], op_end[i], clean_end[i])
+        row_pattern[k:k + 3] = i
+        ttype_pattern[k:k + 3] = (TTYPE_SETUP, TTYPE_OPERATION, TTYPE_CLEANING)
+        k += 3
+        # Tank cleaning in parallel with setup
+        n_tanks = len(tank_ct_per_step[i])
+        start_pattern[k:k + n_tanks] = setup_start[i]
+        end_pattern[k:k + n_tanks] = setup_start[i] + tank_ct_per_step[i]
+        row_pattern[k:k + n_tanks] = num_steps + tank_rows_per_step[i]
+        ttype_pattern[k:k + n_tanks] = TTYPE_TANK
+        k += n_tanks
+
+    starts, ends = get_build_schedule()(setup_start, clean_end, start_pattern, end_pattern, num_cycles)
+
+    # Pack the flat core output into one contiguous structured array (SoA layout)
+    sched = np.empty(len(starts), dtype=SCHEDULE_DTYPE)
+    sched['start'] = starts
+    sched['end'] = ends
+    sched['row'] = np.tile(row_pattern, num_cycles)
+    sched['ttype'] = np.tile(ttype_pattern, num_cycles)
+    return sched